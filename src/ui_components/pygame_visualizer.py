@@ -4,18 +4,23 @@ import time
 import sys
 import random
 import threading
+import collections
 import queue
 import os
 import traceback
+import logging
+
+logger = logging.getLogger(__name__)
 
 class PyGameVisualizer:
-    def __init__(self, width=1000, height=500):
+    def __init__(self, width=1000, height=500, debug=False):
         """
         Creates a visualization of a circle bouncing on a line when talking.
         
         Args:
             width: Width of the window
             height: Height of the window
+            debug: Log every received and displayed phrase
         """
         # Thread safety and communication
         self.word_queue = queue.Queue(maxsize=100)
@@ -26,6 +31,7 @@ class PyGameVisualizer:
         # Configuration
         self.width = width
         self.height = height
+        self.debug = debug
         
         # Set environment variables for PyGame
         os.environ['SDL_VIDEO_CENTERED'] = '1'  # Center the window
@@ -55,7 +61,8 @@ class PyGameVisualizer:
         """
         # Only care about text, not talking state
         if text and text.strip() and self.running:
-            print(f"Visualizer received phrase: {text}")
+            if self.debug:
+                logger.debug(f"Visualizer received phrase: {text}")
             
             # Add complete phrase to the queue for processing in the main thread
             try:
@@ -107,23 +114,9 @@ class PyGameVisualizer:
             pygame.init()
             self.initialized = True
             
-            # Set up the display with hardware acceleration and double buffering
-            try:
-                # Try hardware surface with double buffering for best performance
-                self.screen = pygame.display.set_mode(
-                    (self.width, self.height), 
-                    pygame.HWSURFACE | pygame.DOUBLEBUF | pygame.ANYFORMAT
-                )
-            except pygame.error:
-                try:
-                    print("Failed to create hardware surface, trying software with double buffering")
-                    self.screen = pygame.display.set_mode(
-                        (self.width, self.height), 
-                        pygame.DOUBLEBUF
-                    )
-                except pygame.error:
-                    print("Failed to create double buffered surface, using basic mode")
-                    self.screen = pygame.display.set_mode((self.width, self.height))
+            # Set up the display; HWSURFACE/DOUBLEBUF are no-ops for a non-OpenGL
+            # window on SDL2 and only risk an extra surface conversion per flip
+            self.screen = pygame.display.set_mode((self.width, self.height))
                 
             pygame.display.set_caption("SousDev - Voice Programming Assistant")
             
@@ -152,6 +145,7 @@ class PyGameVisualizer:
             self.circle_x = self.width // 2  # Start in the middle
             self.circle_y = self.line_y  # Position exactly on the line
             self.circle_color = self.WHITE
+            self._circle_surfaces = {}  # (color, radius) -> pre-drawn circle sprite
             
             # Movement properties
             self.direction = 1  # 1 = right, -1 = left
@@ -164,12 +158,13 @@ class PyGameVisualizer:
             self.pulse_direction = 1
             
             # Text display properties
-            self.transcript = []  # List of complete spoken phrases/sentences
             self.max_words_per_line = 8  # Fewer words per line to prevent overflow
             self.max_lines = 6  # More lines to display more text
+            self.transcript = collections.deque(maxlen=self.max_lines)  # Last lines of spoken phrases/sentences
             self.line_spacing = 30  # Smaller spacing between lines
             self.font_size = 24  # Smaller font size to fit more text
             self.max_line_width = self.width - 100  # Maximum width for a line of text
+            self._transcript_surface = None  # Pre-composited transcript, rebuilt on change
             
             # Input box properties
             self.input_box_height = 120
@@ -196,6 +191,10 @@ class PyGameVisualizer:
             self.bounce_frames = 0
             self.max_bounce_frames = 15  # Even fewer frames for stability
             
+            # Redraw tracking; the previous frame stays on screen while nothing changes
+            self._needs_redraw = True
+            self._cursor_visible = False
+            
             # Pre-create font to avoid creating it during rendering
             try:
                 # Try to use a nice font, fallback to system default
@@ -217,6 +216,9 @@ class PyGameVisualizer:
                 print(f"Error creating font: {e}")
                 self.font = None
             
+            # Advance widths of ASCII glyphs so wrapping doesn't need FreeType per word
+            self._char_widths = [self.font.size(chr(c))[0] for c in range(128)] if self.font else []
+            
             print("PyGame visualizer started")
             print("Speak to see words appear! (Press ESC to exit)")
             
@@ -257,9 +259,6 @@ class PyGameVisualizer:
     def _main_loop(self):
         """Main rendering loop"""
         try:
-            last_render_time = time.time()
-            frame_interval = 1.0 / self.fps
-            
             while True:
                 # Check if we should exit
                 with self.lock:
@@ -279,35 +278,27 @@ class PyGameVisualizer:
                             break
                         else:
                             self._handle_keydown(event)
+                            self._needs_redraw = True
                     elif event.type == pygame.MOUSEBUTTONDOWN:
                         self._handle_mouse_click(event)
+                        self._needs_redraw = True
                     elif event.type == pygame.MOUSEMOTION:
                         self._handle_mouse_motion(event)
+                    elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                        self._needs_redraw = True
                 
                 # Process any words in the queue
                 self._process_word_queue()
                 
                 # Update state
                 self._update()
-                
-                # Only render at the specified FPS
-                current_time = time.time()
-                if current_time - last_render_time >= frame_interval:
-                    # Render
-                    self._render()
-                    last_render_time = current_time
-                else:
-                    # Sleep to reduce CPU usage
-                    time.sleep(0.001)
-                
-                # Control frame rate (use try/except to avoid crashes)
-                try:
-                    self.clock.tick(self.fps)
-                except Exception as e:
-                    print(f"Error in clock tick: {e}")
-                    # Don't crash on clock errors, just add a small delay
-                    time.sleep(frame_interval)
-                
+
+                # Render
+                self._render()
+
+                # Control frame rate; the clock is the only pacing source
+                self.clock.tick(self.fps)
+
         except Exception as e:
             print(f"Error in main loop: {e}")
             traceback.print_exc()
@@ -317,35 +308,41 @@ class PyGameVisualizer:
     def _process_word_queue(self):
         """Process any phrases in the queue"""
         try:
-            # Process all available phrases
-            phrases_processed = 0
-            while not self.word_queue.empty() and phrases_processed < 2:  # Process fewer phrases at once
-                phrase = self.word_queue.get(block=False)
+            # Drain available phrases first so the lock is taken once per tick
+            batch = []
+            try:
+                while len(batch) < 2:  # Process fewer phrases at once
+                    batch.append(self.word_queue.get_nowait())
+            except queue.Empty:
+                pass  # No more phrases to process
+            
+            if not batch:
+                return
+            
+            with self.lock:
+                # Set flag to move the circle
+                self.new_word_recognized = True
+                self.should_bounce = True
+                self.bounce_frames = 0
                 
-                try:
-                    with self.lock:
-                        # Set flag to move the circle
-                        self.new_word_recognized = True
-                        self.should_bounce = True
-                        self.bounce_frames = 0
-                        
-                        # Pick a random direction when starting to bounce
-                        self.direction = random.choice([-1, 1])
-                        
+                # Pick a random direction when starting to bounce
+                self.direction = 1 if random.getrandbits(1) else -1
+                
+                for phrase in batch:
+                    try:
                         # Add complete phrase to transcript
                         self._update_transcript(phrase)
                         
-                        print(f"Displaying: {phrase}")
-                        phrases_processed += 1
-                        
-                    # Mark the task as done
-                    self.word_queue.task_done()
-                except Exception as e:
-                    print(f"Error processing phrase: {e}")
-                    traceback.print_exc()
+                        if self.debug:
+                            logger.debug(f"Displaying: {phrase}")
+                    except Exception as e:
+                        print(f"Error processing phrase: {e}")
+                        traceback.print_exc()
+            
+            # Mark the tasks as done
+            for _ in batch:
+                self.word_queue.task_done()
                 
-        except queue.Empty:
-            pass  # No more phrases to process
         except Exception as e:
             print(f"Error processing phrase queue: {e}")
             traceback.print_exc()
@@ -359,18 +356,38 @@ class PyGameVisualizer:
             # Add the complete phrase as a new entry
             phrase_lines = self._wrap_text(new_phrase)
             
-            # Add all lines from the phrase
-            for line in phrase_lines:
-                self.transcript.append(line)
-                    
-            # Keep only the last max_lines
-            if len(self.transcript) > self.max_lines:
-                self.transcript = self.transcript[-self.max_lines:]
+            # Add all lines from the phrase; the deque drops the oldest past max_lines
+            self.transcript.extend(phrase_lines)
+            
+            self._rebuild_transcript_surface()
+            self._needs_redraw = True
                 
         except Exception as e:
             print(f"Error updating transcript: {e}")
             traceback.print_exc()
     
+    def _rebuild_transcript_surface(self):
+        """Composite the transcript lines onto one surface so rendering is a single blit"""
+        if not self.transcript:
+            self._transcript_surface = None
+            return
+        
+        text_surfaces = [self.font.render(line, True, self.BLACK) for line in self.transcript]
+        
+        # As wide as the widest line, so an overlong word isn't clipped
+        surface_width = max(text_surface.get_width() for text_surface in text_surfaces)
+        surface = pygame.Surface(
+            (max(surface_width, 1), len(text_surfaces) * self.line_spacing),
+            pygame.SRCALPHA
+        )
+        
+        for i, text_surface in enumerate(text_surfaces):
+            # Center the text horizontally within the surface
+            text_x = (surface_width - text_surface.get_width()) // 2
+            surface.blit(text_surface, (text_x, i * self.line_spacing))
+        
+        self._transcript_surface = surface
+    
     def _wrap_text(self, text):
         """Wrap text to fit within the display width"""
         if not self.font or not text:
@@ -379,23 +396,42 @@ class PyGameVisualizer:
         words = text.split()
         lines = []
         current_line = ""
+        current_width = 0
+        space_width = self._char_widths[ord(" ")]
+        
+        # The glyph table runs a few percent low (no kerning or sub-pixel
+        # advances), so lines it puts near the limit are measured exactly
+        exact_check_width = self.max_line_width * 0.9
         
         for word in words:
+            word_width = self._text_width(word)
             test_line = current_line + " " + word if current_line else word
-            text_surface = self.font.render(test_line, True, self.BLACK)
+            test_width = current_width + space_width + word_width if current_line else word_width
+            if test_width > exact_check_width:
+                test_width = self.font.size(test_line)[0]
             
-            if text_surface.get_width() <= self.max_line_width:
+            if test_width <= self.max_line_width:
                 current_line = test_line
+                current_width = test_width
             else:
                 if current_line:
                     lines.append(current_line)
                 current_line = word
+                current_width = word_width
         
         if current_line:
             lines.append(current_line)
             
         return lines
     
+    def _text_width(self, text):
+        """Approximate rendered width from the glyph advance table (ignores kerning)"""
+        char_widths = self._char_widths
+        return sum(
+            char_widths[ord(c)] if ord(c) < 128 else self.font.size(c)[0]
+            for c in text
+        )
+    
     def _handle_keydown(self, event):
         """Handle keyboard input for the text box"""
         if not self.input_active:
@@ -445,10 +481,13 @@ class PyGameVisualizer:
         mouse_x, mouse_y = event.pos
         
         # Check if hovering over send button
-        self.button_hovered = (
+        button_hovered = (
             self.button_x <= mouse_x <= self.button_x + self.button_width and
             self.button_y <= mouse_y <= self.button_y + self.button_height
         )
+        if button_hovered != self.button_hovered:
+            self.button_hovered = button_hovered
+            self._needs_redraw = True
     
     def _update_input_lines(self):
         """Update the input lines for word wrapping"""
@@ -465,7 +504,8 @@ class PyGameVisualizer:
         if self.input_text.strip():
             # Add to transcript
             self._update_transcript(self.input_text.strip())
-            print(f"User typed: {self.input_text.strip()}")
+            if self.debug:
+                logger.debug(f"User typed: {self.input_text.strip()}")
             
             # Clear input
             self.input_text = ""
@@ -476,6 +516,8 @@ class PyGameVisualizer:
         """Update the circle position and color"""
         try:
             with self.lock:
+                previous_state = (self.circle_x, self.circle_color, self.pulse_size)
+                
                 if self.new_word_recognized:
                     # Reset the flag but keep bouncing
                     self.new_word_recognized = False
@@ -524,6 +566,15 @@ class PyGameVisualizer:
                 else:
                     # Reset pulse when not bouncing
                     self.pulse_size = 0
+                
+                if (self.circle_x, self.circle_color, self.pulse_size) != previous_state:
+                    self._needs_redraw = True
+            
+            # Blink the cursor every 0.5 seconds while the input box is active
+            cursor_visible = self.input_active and bool(int(time.time() * 2) % 2)
+            if cursor_visible != self._cursor_visible:
+                self._cursor_visible = cursor_visible
+                self._needs_redraw = True
         except Exception as e:
             print(f"Error in update: {e}")
             traceback.print_exc()
@@ -533,6 +584,11 @@ class PyGameVisualizer:
         try:
             if not self.running or not self.initialized or not self.screen:
                 return
+            
+            # Nothing changed since the last frame, keep it on screen
+            if not self._needs_redraw:
+                return
+            self._needs_redraw = False
                 
             # Fill the background
             self.screen.fill(self.WHITE)
@@ -551,39 +607,22 @@ class PyGameVisualizer:
             circle_x, circle_y = int(self.circle_x), int(self.circle_y)
             radius = int(actual_radius)
             
-            # Draw filled anti-aliased circle
-            pygame.gfxdraw.aacircle(self.screen, circle_x, circle_y, radius, self.circle_color)
-            pygame.gfxdraw.filled_circle(self.screen, circle_x, circle_y, radius, self.circle_color)
-            
-            # Draw anti-aliased outline
-            pygame.gfxdraw.aacircle(self.screen, circle_x, circle_y, radius, self.BLACK)
-            if radius > 1:
-                pygame.gfxdraw.aacircle(self.screen, circle_x, circle_y, radius-1, self.BLACK)
+            # Blit the pre-drawn circle sprite centered on the circle position
+            self.screen.blit(
+                self._get_circle(self.circle_color, radius),
+                (circle_x - radius, circle_y - radius)
+            )
             
             # Draw recognized words above the line
             with self.lock:
-                transcript_lines = self.transcript.copy()  # Make a copy to avoid changes during rendering
+                transcript_surface = self._transcript_surface
+                line_count = len(self.transcript)
                 
-            if transcript_lines and self.font:
-                try:
-                    # Calculate starting position for the first line
-                    # Position text higher up to make room for more lines
-                    start_y = self.line_y - 80 - ((len(transcript_lines) - 1) * self.line_spacing)
-                    
-                    # Draw each line
-                    for i, line in enumerate(transcript_lines):
-                        # Render the text
-                        text_surface = self.font.render(line, True, self.BLACK)
-                        
-                        # Center the text horizontally
-                        text_width = text_surface.get_width()
-                        text_x = (self.width - text_width) // 2
-                        
-                        # Draw the text
-                        self.screen.blit(text_surface, (text_x, start_y + i * self.line_spacing))
-                except Exception as e:
-                    print(f"Error rendering text: {e}")
-                    traceback.print_exc()
+            if transcript_surface is not None:
+                # Position text higher up to make room for more lines
+                start_y = self.line_y - 80 - ((line_count - 1) * self.line_spacing)
+                text_x = (self.width - transcript_surface.get_width()) // 2
+                self.screen.blit(transcript_surface, (text_x, start_y))
             
             # Draw input box and send button
             self._render_input_elements()
@@ -599,6 +638,26 @@ class PyGameVisualizer:
             print(f"Error in render: {e}")
             traceback.print_exc()
     
+    def _get_circle(self, color, radius):
+        """Return a cached sprite of the filled, outlined circle for this color and radius"""
+        key = (color, radius)
+        surface = self._circle_surfaces.get(key)
+        if surface is None:
+            size = radius * 2 + 1
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            
+            # Draw filled anti-aliased circle
+            pygame.gfxdraw.aacircle(surface, radius, radius, radius, color)
+            pygame.gfxdraw.filled_circle(surface, radius, radius, radius, color)
+            
+            # Draw anti-aliased outline
+            pygame.gfxdraw.aacircle(surface, radius, radius, radius, self.BLACK)
+            if radius > 1:
+                pygame.gfxdraw.aacircle(surface, radius, radius, radius-1, self.BLACK)
+            
+            self._circle_surfaces[key] = surface
+        return surface
+    
     def _render_input_elements(self):
         """Render the input box and send button"""
         try:
@@ -646,7 +705,7 @@ class PyGameVisualizer:
                                   (last_line_index - self.input_scroll) * (self.font_size + 2))
                         
                         # Draw blinking cursor
-                        if int(time.time() * 2) % 2:  # Blink every 0.5 seconds
+                        if self._cursor_visible:
                             pygame.draw.line(self.screen, self.BLACK, 
                                            (cursor_x, cursor_y), 
                                            (cursor_x, cursor_y + self.font_size), 2)
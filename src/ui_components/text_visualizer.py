@@ -1,9 +1,13 @@
 import threading
 import time
 import queue
+import collections
 import os
 import sys
 import traceback
+import logging
+
+logger = logging.getLogger(__name__)
 
 class TextVisualizer:
     """
@@ -11,13 +15,14 @@ class TextVisualizer:
     This is a fallback for when PyGame causes segmentation faults.
     """
     
-    def __init__(self, width=80, height=20):
+    def __init__(self, width=80, height=20, debug=False):
         """
         Initialize the text visualizer
         
         Args:
             width: Width of the display area in characters
             height: Height of the display area in characters
+            debug: Log every received word
         """
         # Thread safety and communication
         self.word_queue = queue.Queue()
@@ -27,10 +32,11 @@ class TextVisualizer:
         # Configuration
         self.width = width
         self.height = height
+        self.debug = debug
         
         # Words storage
-        self.words = []
         self.max_words = 100  # Maximum number of words to store
+        self.words = collections.deque(maxlen=self.max_words)
         
         print("Text visualizer initialized")
     
@@ -44,7 +50,8 @@ class TextVisualizer:
         """
         # Only care about text, not talking state
         if text and text.strip() and self.running:
-            print(f"Visualizer received word: {text}")
+            if self.debug:
+                logger.debug(f"Visualizer received word: {text}")
             
             # Add word to the queue for processing in the main thread
             try:
@@ -117,21 +124,17 @@ class TextVisualizer:
     def _process_word_queue(self):
         """Process any words in the queue"""
         try:
-            # Process all available words
-            words_processed = 0
-            while not self.word_queue.empty() and words_processed < 10:  # Process up to 10 words at once
-                word = self.word_queue.get(block=False)
+            # Process up to 10 available words at once
+            for _ in range(10):
+                try:
+                    word = self.word_queue.get_nowait()
+                except queue.Empty:
+                    break  # No more words to process
                 
                 try:
                     with self.lock:
-                        # Add word to the list
+                        # Add word to the list; the deque drops the oldest past max_words
                         self.words.append(word)
-                        
-                        # If we have more words than the limit, remove oldest
-                        if len(self.words) > self.max_words:
-                            self.words = self.words[-self.max_words:]
-                        
-                        words_processed += 1
                     
                     # Mark task as done
                     self.word_queue.task_done()
@@ -139,8 +142,6 @@ class TextVisualizer:
                     print(f"Error processing word: {e}")
                     traceback.print_exc()
                 
-        except queue.Empty:
-            pass  # No more words to process
         except Exception as e:
             print(f"Error processing word queue: {e}")
             traceback.print_exc()
@@ -0,0 +1,84 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled line scanner for ProjectAnalyzer.extract_code_elements
+
+Walks the raw file bytes once, finding line starts and testing prefixes with
+memcmp instead of splitting and stripping Python strings. Build in place with:
+
+    cythonize -i src/vectorization/_scan.pyx
+
+project_analyzer falls back to the pure-Python scanner when this isn't built.
+"""
+
+from libc.string cimport memcmp
+
+KIND_OTHER = 0
+KIND_JS = 1
+KIND_PY = 2
+
+
+cdef inline bint _is_space(unsigned char c):
+    return c == 32 or 9 <= c <= 13
+
+
+cdef inline bint _starts_with(const unsigned char[::1] buf, Py_ssize_t start, Py_ssize_t end, bytes prefix):
+    cdef Py_ssize_t size = len(prefix)
+    return end - start >= size and memcmp(&buf[start], <const char*>prefix, size) == 0
+
+
+def scan_file(bytes content, int kind):
+    """Return (imports, exports, key_elements) with the same limits as the Python scanner"""
+    cdef const unsigned char[::1] buf = content
+    cdef Py_ssize_t length = len(content)
+    cdef Py_ssize_t pos = 0, start, end, line_end
+    cdef int line_number = 0
+    cdef bint is_js = kind == KIND_JS
+    cdef list imports = [], exports = [], elements = []
+
+    if kind != KIND_JS and kind != KIND_PY:
+        return imports, exports, elements
+
+    while pos <= length:
+        line_end = content.find(b'\n', pos)
+        if line_end == -1:
+            line_end = length
+
+        # Strip surrounding whitespace
+        start = pos
+        end = line_end
+        while start < end and _is_space(buf[start]):
+            start += 1
+        while end > start and _is_space(buf[end - 1]):
+            end -= 1
+
+        # Imports only come from the first 50 lines, limited to 10
+        if line_number < 50 and len(imports) < 10:
+            if is_js:
+                if _starts_with(buf, start, end, b'import ') and content.find(b' from ', start, end) != -1:
+                    parts = content[start:end].decode('utf-8', 'ignore').split(' from ')
+                    imports.append(parts[len(parts) - 1].strip().strip('\'"`;'))
+            elif _starts_with(buf, start, end, b'import ') or _starts_with(buf, start, end, b'from '):
+                imports.append(content[start:end].decode('utf-8', 'ignore'))
+
+        if is_js:
+            if len(exports) < 5 and _starts_with(buf, start, end, b'export '):
+                exports.append(content[start:end].decode('utf-8', 'ignore')[:100])
+
+            if len(elements) < 10 and (
+                    _starts_with(buf, start, end, b'function ') or
+                    _starts_with(buf, start, end, b'export function ') or
+                    _starts_with(buf, start, end, b'export const ') or
+                    _starts_with(buf, start, end, b'const ') and content.find(b'=>', start, end) != -1):
+                elements.append(content[start:end].decode('utf-8', 'ignore')[:150])
+        elif len(elements) < 10 and (_starts_with(buf, start, end, b'def ') or
+                                     _starts_with(buf, start, end, b'class ')):
+            elements.append(content[start:end].decode('utf-8', 'ignore')[:100])
+
+        # Stop once every list is full
+        if line_number >= 50 and len(elements) >= 10 and (not is_js or len(exports) >= 5):
+            break
+
+        pos = line_end + 1
+        line_number += 1
+
+    return imports, exports, elements
@@ -4,25 +4,45 @@ Project Analysis System for SousDev
 Analyzes project structure and creates intelligent project understanding
 """
 
+import io
 import os
+import re
 import sys
 import json
+import stat
 import time
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import anthropic
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional compiled scanner (see _scan.pyx); extract_code_elements is the fallback
+try:
+    from _scan import scan_file, KIND_JS, KIND_PY
+except ImportError:
+    scan_file = None
+
 # Load environment variables
 load_dotenv()
 
 # File and directory exclusions
-EXCLUDED_DIRS = {
+EXCLUDED_DIRS = frozenset({
     'node_modules', '.git', 'dist', 'build', '__pycache__', 
     '.next', '.vscode', '.idea', 'coverage', '.pytest_cache',
     'vendor', 'tmp', 'temp', '.cache', '.nuxt', '.output',
     '.svelte-kit', '.expo', 'logs', '.DS_Store'
-}
+})
+
+# Hidden directories are tool state (.terraform, .gradle, ...) except these
+INCLUDED_HIDDEN_DIRS = frozenset({'.github'})
 
 CODE_EXTENSIONS = {
     '.js', '.jsx', '.ts', '.tsx',           # JavaScript/TypeScript
@@ -49,10 +69,151 @@ IMPORTANT_CONFIGS = {
     'pyproject.toml', 'setup.py', 'Cargo.toml', 'go.mod'
 }
 
+JS_EXTENSIONS = {'.js', '.jsx', '.ts', '.tsx'}
+
+# Line prefixes for the single-pass extractor (str.startswith on a tuple runs in C)
+PY_IMPORT_PREFIXES = ('import ', 'from ')
+PY_DEFINITION_PREFIXES = ('def ', 'class ')
+JS_DEFINITION_PREFIXES = ('function ', 'export function ', 'export const ')
+
+# File types decided by extension alone
+EXTENSION_FILE_TYPES = {
+    '.css': 'stylesheet', '.scss': 'stylesheet', '.sass': 'stylesheet',
+    '.md': 'documentation'
+}
+
+# Framework markers are imports, so only the start of a file is sniffed for them
+SNIFF_CHARS = 4096
+EXPRESS_PATTERN = re.compile(r'express|app\.listen', re.IGNORECASE)
+ELECTRON_PATTERN = re.compile(r'electron', re.IGNORECASE)
+PYTHON_API_PATTERN = re.compile(r'fastapi|flask', re.IGNORECASE)
+FUNCTION_OR_CONST_PATTERN = re.compile(r'function|const', re.IGNORECASE)
+
+# Bump whenever file_info changes shape or the parsers change their output,
+# so AnalysisCache drops rows produced by the old code
+ANALYSIS_VERSION = 2
+
+# File reads are I/O bound, so threads overlap them despite the GIL
+MAX_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+def _parse_one(task):
+    """Read and parse one file for ProjectAnalyzer._analyze_files
+    
+    Returns (index, file_path, size, mtime, sha1, file_info); size is None
+    when the file couldn't be read, and file_info is None when the content
+    hash equals known_sha1, meaning the cached file_info still applies.
+    """
+    index, file_path, relative_path, known_sha1 = task
+    try:
+        # Whole file: type markers such as __main__ guards and module.exports
+        # usually sit at the end, and walked files are at most 500KB anyway
+        with open(file_path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            raw = f.read()
+        
+        sha1 = hashlib.sha1(raw).digest()
+        if sha1 == known_sha1:
+            return index, file_path, size, st.st_mtime, sha1, None
+        
+        content = raw.decode('utf-8', errors='ignore')
+        
+        file_ext = os.path.splitext(file_path)[1].lower()
+        if scan_file is not None:
+            kind = KIND_JS if file_ext in JS_EXTENSIONS else KIND_PY if file_ext == '.py' else 0
+            imports, exports, key_elements = scan_file(raw, kind)
+        else:
+            imports, exports, key_elements = ProjectAnalyzer.extract_code_elements(content, file_ext)
+        
+        file_info = {
+            "path": relative_path,
+            "type": ProjectAnalyzer.detect_file_type(content, file_ext),
+            "size": len(content),
+            "lines": content.count('\n') + 1,
+            "imports": imports,
+            "exports": exports,
+            "key_elements": key_elements,
+            # Kept in memory for stage 2 so files are only read once
+            "_content_preview": content[:5000]
+        }
+        
+        return index, file_path, size, st.st_mtime, sha1, file_info
+        
+    except Exception as e:
+        print(f"Warning: Could not analyze {file_path}: {str(e)}")
+        return index, file_path, None, None, None, None
+
+class AnalysisCache:
+    """SQLite cache of analyze_file_content results keyed by file path.
+    
+    A row is reused as-is while the file's size and mtime are unchanged; when
+    they change, a matching content hash still avoids re-parsing the file.
+    Rows written by another ANALYSIS_VERSION are discarded on open, and a
+    corrupt cache file is replaced. A locked one raises sqlite3.OperationalError.
+    """
+    
+    def __init__(self, cache_path):
+        try:
+            self.connection = self._connect(cache_path)
+        except sqlite3.OperationalError:
+            raise
+        except sqlite3.DatabaseError as e:
+            print(f"Warning: Recreating corrupt analysis cache {cache_path}: {str(e)}")
+            os.remove(cache_path)
+            self.connection = self._connect(cache_path)
+        self.seen_paths = set()
+    
+    @staticmethod
+    def _connect(cache_path):
+        connection = sqlite3.connect(cache_path)
+        try:
+            # The schema version lives in the database header
+            if connection.execute("PRAGMA user_version").fetchone()[0] != ANALYSIS_VERSION:
+                connection.execute("DROP TABLE IF EXISTS file_analysis")
+                connection.execute(f"PRAGMA user_version = {ANALYSIS_VERSION}")
+            
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS file_analysis ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha1 BLOB, file_info_json TEXT)"
+            )
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+    
+    def get(self, path):
+        """Return (size, mtime, sha1, file_info) for path, or None"""
+        self.seen_paths.add(path)
+        row = self.connection.execute(
+            "SELECT size, mtime, sha1, file_info_json FROM file_analysis WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2], json.loads(row[3])
+    
+    def put(self, path, size, mtime, sha1, file_info):
+        self.seen_paths.add(path)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO file_analysis VALUES (?, ?, ?, ?, ?)",
+            (path, size, mtime, sha1, json.dumps(file_info))
+        )
+    
+    def prune(self):
+        """Delete rows for files not looked up since the cache was opened"""
+        self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS seen_paths (path TEXT PRIMARY KEY)")
+        self.connection.execute("DELETE FROM seen_paths")
+        self.connection.executemany("INSERT INTO seen_paths VALUES (?)", ((path,) for path in self.seen_paths))
+        self.connection.execute("DELETE FROM file_analysis WHERE path NOT IN (SELECT path FROM seen_paths)")
+    
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
 class ProjectAnalyzer:
     def __init__(self, anthropic_api_key):
         self.client = anthropic.Anthropic(api_key=anthropic_api_key)
         self.analysis_start_time = datetime.now()
+        self.cache = None  # AnalysisCache, open while analyze_project runs
         
     def analyze_project(self, project_path, output_path):
         """Main analysis pipeline"""
@@ -62,11 +223,23 @@ class ProjectAnalyzer:
         intelligence_dir = os.path.join(output_path, "project_intelligence")
         os.makedirs(intelligence_dir, exist_ok=True)
         
+        # Reuse per-file results from previous runs on this project; the cache
+        # is only an optimization, so the analysis runs without it if need be
+        try:
+            self.cache = AnalysisCache(os.path.join(intelligence_dir, "analysis_cache.sqlite"))
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: Running without the analysis cache: {str(e)}")
+            self.cache = None
+        
         try:
             # Stage 1: File Structure Analysis
             print("Stage 1: Analyzing file structure...")
             file_structure = self.analyze_file_structure(project_path)
-            self.save_json(file_structure, os.path.join(intelligence_dir, "file_structure.json"))
+            
+            # Files that were deleted or fell out of the analyzed set
+            if self.cache:
+                self.cache.prune()
+            self.save_json(self._without_previews(file_structure), os.path.join(intelligence_dir, "file_structure.json"))
             
             # Stage 2: Deep Claude Analysis (with caching)
             print("Stage 2: Running deep architectural analysis...")
@@ -90,6 +263,11 @@ class ProjectAnalyzer:
         except Exception as e:
             print(f"❌ Error during project analysis: {str(e)}")
             return False
+        
+        finally:
+            if self.cache:
+                self.cache.close()
+                self.cache = None
 
     def analyze_file_structure(self, project_path):
         """Stage 1: Walk project files and create inventory"""
@@ -109,51 +287,38 @@ class ProjectAnalyzer:
         code_files = []
         config_files = []
         
-        for root, dirs, files in os.walk(project_path):
-            # Skip excluded directories
-            dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for file, relative_path, file_ext in self._iter_files(project_path):
+            # Important config files
+            if file in IMPORTANT_CONFIGS:
+                config_files.append(relative_path)
+                file_structure["technology_detection"]["config_files"].append(file)
             
-            for file in files:
-                file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, project_path)
-                file_ext = os.path.splitext(file)[1].lower()
+            # Code files
+            elif file_ext in CODE_EXTENSIONS:
+                code_files.append(relative_path)
                 
-                # Skip large files
-                try:
-                    if os.path.getsize(file_path) > 500_000:  # Skip files > 500KB
-                        continue
-                except:
-                    continue
-                
-                # Important config files
-                if file in IMPORTANT_CONFIGS:
-                    config_files.append(relative_path)
-                    file_structure["technology_detection"]["config_files"].append(file)
-                
-                # Code files
-                elif file_ext in CODE_EXTENSIONS:
-                    code_files.append(relative_path)
-                    
-                    # Detect technologies
-                    if file_ext in ['.js', '.jsx', '.ts', '.tsx']:
-                        file_structure["technology_detection"]["languages"].add("JavaScript/TypeScript")
-                        if file_ext in ['.jsx', '.tsx']:
-                            file_structure["technology_detection"]["frameworks"].add("React")
-                    elif file_ext in ['.py']:
-                        file_structure["technology_detection"]["languages"].add("Python")
-                    elif file_ext in ['.vue']:
-                        file_structure["technology_detection"]["frameworks"].add("Vue")
-                    elif file_ext in ['.svelte']:
-                        file_structure["technology_detection"]["frameworks"].add("Svelte")
+                # Detect technologies
+                if file_ext in ['.js', '.jsx', '.ts', '.tsx']:
+                    file_structure["technology_detection"]["languages"].add("JavaScript/TypeScript")
+                    if file_ext in ['.jsx', '.tsx']:
+                        file_structure["technology_detection"]["frameworks"].add("React")
+                elif file_ext in ['.py']:
+                    file_structure["technology_detection"]["languages"].add("Python")
+                elif file_ext in ['.vue']:
+                    file_structure["technology_detection"]["frameworks"].add("Vue")
+                elif file_ext in ['.svelte']:
+                    file_structure["technology_detection"]["frameworks"].add("Svelte")
         
         # Convert sets to lists for JSON serialization
         file_structure["technology_detection"]["languages"] = list(file_structure["technology_detection"]["languages"])
         file_structure["technology_detection"]["frameworks"] = list(file_structure["technology_detection"]["frameworks"])
         
         # Analyze file contents for deeper understanding
-        for file_path in code_files[:50]:  # Limit to first 50 files for analysis
-            full_path = os.path.join(project_path, file_path)
-            file_info = self.analyze_file_content(full_path, file_path)
+        selected_files = code_files[:50]  # Limit to first 50 files for analysis
+        file_infos = self._analyze_files([
+            (os.path.join(project_path, file_path), file_path) for file_path in selected_files
+        ])
+        for file_info in file_infos:
             if file_info:
                 file_structure["file_inventory"].append(file_info)
         
@@ -165,48 +330,154 @@ class ProjectAnalyzer:
         
         return file_structure
 
-    def analyze_file_content(self, file_path, relative_path):
-        """Extract meaningful information from code files"""
-        try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+    def _iter_files(self, project_path):
+        """Yield (name, relative_path, ext) for files under project_path in os.walk order"""
+        if hasattr(os, 'fwalk'):
+            return self._fwalk_files(project_path)
+        return self._scandir_files(project_path)
+    
+    def _fwalk_files(self, project_path):
+        """POSIX walk that stats files relative to the open directory fd (fstatat)
+        instead of resolving each full path again"""
+        for dirpath, dirnames, filenames, dirfd in os.fwalk(project_path, follow_symlinks=False):
+            # Skip excluded and hidden directories
+            dirnames[:] = [
+                d for d in dirnames
+                if d not in EXCLUDED_DIRS and (d[0] != '.' or d in INCLUDED_HIDDEN_DIRS)
+            ]
             
-            file_ext = os.path.splitext(file_path)[1].lower()
+            relative_dir = os.path.relpath(dirpath, project_path)
+            for file in filenames:
+                try:
+                    st = os.stat(file, dir_fd=dirfd)
+                except OSError:
+                    continue
+                
+                # Skip large files
+                if not stat.S_ISREG(st.st_mode) or st.st_size > 500_000:  # Skip files > 500KB
+                    continue
+                
+                relative_path = file if relative_dir == os.curdir else os.path.join(relative_dir, file)
+                yield file, relative_path, os.path.splitext(file)[1].lower()
+    
+    def _scandir_files(self, project_path, relative_dir=""):
+        """Portable walk using scandir so types and sizes come from the dirent
+        without extra path lookups"""
+        try:
+            entries = os.scandir(os.path.join(project_path, relative_dir))
+        except OSError:
+            return
+        
+        subdirs = []
+        with entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Skip excluded and hidden directories
+                        name = entry.name
+                        if name not in EXCLUDED_DIRS and (name[0] != '.' or name in INCLUDED_HIDDEN_DIRS):
+                            subdirs.append(relative_path)
+                        continue
+                    
+                    # Skip large files (and symlinks to directories)
+                    if not entry.is_file() or entry.stat().st_size > 500_000:  # Skip files > 500KB
+                        continue
+                except OSError:
+                    continue
+                
+                yield entry.name, relative_path, os.path.splitext(entry.name)[1].lower()
+        
+        for relative_path in subdirs:
+            yield from self._scandir_files(project_path, relative_path)
+    
+    def analyze_file_content(self, file_path, relative_path):
+        """Extract meaningful information from code files
+        
+        Results go through self.cache when it is open.
+        """
+        return self._analyze_files([(file_path, relative_path)])[0]
+    
+    def _analyze_files(self, files):
+        """analyze_file_content for a list of (file_path, relative_path) pairs
+        
+        Returns the file_info (or None) for each pair, in order. At most 50
+        files are analyzed and parsing each takes well under a millisecond, so
+        the files that need parsing are read on threads; worker processes
+        would cost more to start than the parsing itself.
+        """
+        file_infos = [None] * len(files)
+        cache = self.cache
+        cached_infos = {}
+        tasks = []
+        
+        for index, (file_path, relative_path) in enumerate(files):
+            known_sha1 = None
+            cached = cache.get(file_path) if cache else None
+            if cached:
+                try:
+                    st = os.stat(file_path)
+                except OSError:
+                    st = None
+                
+                if st and cached[0] == st.st_size:
+                    # Unchanged since the last run
+                    if cached[1] == st.st_mtime:
+                        file_infos[index] = cached[3]
+                        continue
+                    
+                    # Touched, so let the parser compare content hashes
+                    known_sha1 = cached[2]
+                    cached_infos[index] = cached[3]
             
-            file_info = {
-                "path": relative_path,
-                "type": self.detect_file_type(content, file_ext),
-                "size": len(content),
-                "lines": len(content.split('\n')),
-                "imports": self.extract_imports(content, file_ext),
-                "exports": self.extract_exports(content, file_ext),
-                "key_elements": self.extract_key_elements(content, file_ext)
-            }
+            tasks.append((index, file_path, relative_path, known_sha1))
+        
+        with ThreadPoolExecutor(max_workers=MAX_READ_WORKERS) as executor:
+            results = list(executor.map(_parse_one, tasks))
+        
+        for index, file_path, size, mtime, sha1, file_info in results:
+            if size is None:
+                continue
             
-            return file_info
+            # Identical content, just refresh the stat fields
+            if file_info is None:
+                file_info = cached_infos[index]
             
-        except Exception as e:
-            print(f"Warning: Could not analyze {file_path}: {str(e)}")
-            return None
+            file_infos[index] = file_info
+            if cache:
+                cache.put(file_path, size, mtime, sha1, file_info)
+        
+        return file_infos
+
+    def _without_previews(self, file_structure):
+        """Copy of file_structure without the in-memory content previews"""
+        return dict(file_structure, file_inventory=[
+            {key: value for key, value in file_info.items() if key != '_content_preview'}
+            for file_info in file_structure['file_inventory']
+        ])
 
-    def detect_file_type(self, content, file_ext):
+    @staticmethod
+    def detect_file_type(content, file_ext):
         """Detect the type/purpose of a file"""
-        content_lower = content.lower()
+        # Extension alone is enough for most files; only JS/TS/Python need a content sniff
+        if file_ext in EXTENSION_FILE_TYPES:
+            return EXTENSION_FILE_TYPES[file_ext]
         
+        # Case-insensitive patterns match in place, without a lowercased copy of the file
         if file_ext in ['.tsx', '.jsx']:
-            if 'export default' in content and ('function' in content_lower or 'const' in content_lower):
+            if 'export default' in content and FUNCTION_OR_CONST_PATTERN.search(content):
                 return "react_component"
             elif 'export' in content:
                 return "react_module"
         elif file_ext in ['.js', '.ts']:
-            if 'express' in content_lower or 'app.listen' in content_lower:
+            if EXPRESS_PATTERN.search(content, 0, SNIFF_CHARS):
                 return "express_server"
-            elif 'electron' in content_lower:
+            elif ELECTRON_PATTERN.search(content, 0, SNIFF_CHARS):
                 return "electron_main"
             elif 'export' in content or 'module.exports' in content:
                 return "javascript_module"
         elif file_ext == '.py':
-            if 'fastapi' in content_lower or 'flask' in content_lower:
+            if PYTHON_API_PATTERN.search(content, 0, SNIFF_CHARS):
                 return "python_api_server"
             elif 'if __name__ == "__main__"' in content:
                 return "python_script"
@@ -214,89 +485,63 @@ class ProjectAnalyzer:
                 return "python_class_module"
             else:
                 return "python_module"
-        elif file_ext in ['.css', '.scss', '.sass']:
-            return "stylesheet"
-        elif file_ext == '.md':
-            return "documentation"
         
         return "code_file"
 
-    def extract_imports(self, content, file_ext):
-        """Extract import statements"""
+    @staticmethod
+    def extract_code_elements(content, file_ext):
+        """Extract imports, exports and key functions/classes/components in one pass"""
         imports = []
-        lines = content.split('\n')
+        exports = []
+        elements = []
+        
+        is_js = file_ext in JS_EXTENSIONS
+        if not is_js and file_ext != '.py':
+            return imports, exports, elements
         
-        for line in lines[:50]:  # Check first 50 lines
+        # Iterate lazily so the early break doesn't pay for splitting the unread tail
+        for line_number, line in enumerate(io.StringIO(content, newline='\n')):
             line = line.strip()
-            if file_ext in ['.js', '.jsx', '.ts', '.tsx']:
-                if line.startswith('import ') and ' from ' in line:
-                    # Extract from "import X from 'Y'" or "import { X } from 'Y'"
-                    try:
-                        from_part = line.split(' from ')[-1].strip().strip('\'"`;')
-                        imports.append(from_part)
-                    except:
-                        pass
-            elif file_ext == '.py':
-                if line.startswith('import ') or line.startswith('from '):
+            
+            # Imports only come from the first 50 lines, limited to 10
+            if line_number < 50 and len(imports) < 10:
+                if is_js:
+                    if line.startswith('import ') and ' from ' in line:
+                        # Extract from "import X from 'Y'" or "import { X } from 'Y'"
+                        imports.append(line.split(' from ')[-1].strip().strip('\'"`;'))
+                elif line.startswith(PY_IMPORT_PREFIXES):
                     imports.append(line)
-        
-        return imports[:10]  # Limit to first 10 imports
-
-    def extract_exports(self, content, file_ext):
-        """Extract export statements"""
-        exports = []
-        
-        if file_ext in ['.js', '.jsx', '.ts', '.tsx']:
-            lines = content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line.startswith('export '):
+            
+            if is_js:
+                if len(exports) < 5 and line.startswith('export '):
                     exports.append(line[:100])  # Truncate long exports
-        
-        return exports[:5]  # Limit to first 5 exports
-
-    def extract_key_elements(self, content, file_ext):
-        """Extract key functions, classes, components, etc."""
-        elements = []
-        
-        if file_ext in ['.js', '.jsx', '.ts', '.tsx']:
-            # Look for function/component definitions
-            lines = content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if (line.startswith('function ') or 
-                    line.startswith('const ') and '=>' in line or
-                    line.startswith('export function ') or
-                    line.startswith('export const ')):
+                
+                # Look for function/component definitions
+                if len(elements) < 10 and (line.startswith(JS_DEFINITION_PREFIXES) or
+                                           line.startswith('const ') and '=>' in line):
                     elements.append(line[:150])  # Truncate long lines
-        elif file_ext == '.py':
-            # Look for function and class definitions
-            lines = content.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line.startswith('def ') or line.startswith('class '):
-                    elements.append(line[:100])
+            elif len(elements) < 10 and line.startswith(PY_DEFINITION_PREFIXES):
+                # Look for function and class definitions
+                elements.append(line[:100])
+            
+            # Stop once every list is full
+            if (line_number >= 50 and len(elements) >= 10 and
+                    (not is_js or len(exports) >= 5)):
+                break
         
-        return elements[:10]  # Limit to first 10 elements
+        return imports, exports, elements
 
     def deep_claude_analysis(self, project_path, file_structure):
         """Stage 2: Deep analysis using Claude Sonnet 4 with caching"""
         
-        # Prepare code content for analysis
+        # Prepare code content for analysis from the previews captured in stage 1
         code_chunks = []
         for file_info in file_structure['file_inventory']:
-            try:
-                full_path = os.path.join(project_path, file_info['path'])
-                with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                
-                code_chunks.append({
-                    "file_path": file_info['path'],
-                    "file_type": file_info['type'],
-                    "content": content[:5000]  # Limit content to 5000 chars per file
-                })
-            except:
-                continue
+            code_chunks.append({
+                "file_path": file_info['path'],
+                "file_type": file_info['type'],
+                "content": file_info['_content_preview']  # Limited to 5000 chars per file
+            })
         
         # Create the analysis prompt
         analysis_prompt = self.create_analysis_prompt(file_structure, code_chunks)
@@ -445,13 +690,13 @@ File: {file_info['path']} ({file_info['type']})
     def parse_claude_response(self, response_text):
         """Parse Claude's JSON response"""
         try:
-            # Try to extract JSON from the response
+            # Decode the first complete JSON object in the response in one pass;
+            # anything after it is ignored
             start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
             
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx]
-                return json.loads(json_str)
+            if start_idx != -1:
+                analysis, _ = json.JSONDecoder().raw_decode(response_text, start_idx)
+                return analysis
             else:
                 # If no JSON found, return the raw response
                 return {"raw_response": response_text, "parse_error": "No JSON found"}
@@ -462,8 +707,11 @@ File: {file_info['path']} ({file_info['type']})
     def save_json(self, data, file_path):
         """Save data as JSON file"""
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                Path(file_path).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
             print(f"✅ Saved: {file_path}")
         except Exception as e:
             print(f"❌ Error saving {file_path}: {str(e)}")
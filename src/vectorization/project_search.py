@@ -1,19 +1,106 @@
 import os
 import json
+import base64
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import numpy as np
 import faiss
 from openai import OpenAI
 import tiktoken
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Query embeddings shared across ProjectSearch instances, keyed by (model, query).
+# search_similar_content builds a new searcher per call, so the cache lives here.
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+_query_embedding_cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+_query_embedding_cache_lock = threading.Lock()
+
+# Flat indexes larger than this are converted to HNSW for sublinear search
+HNSW_MIN_VECTORS = 50_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF copies built from an index_factory string probe as many lists as the
+# vectorizer's own IVF index; FAISS's default of one misses most neighbors
+IVF_NPROBE = 16
+
+# Let exhaustive (flat) search use every core
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+# IO_FLAG_MMAP only maps IVF inverted lists; IO_FLAG_MMAP_IFC (newer FAISS)
+# maps the vectors of flat and HNSW indexes as well
+MMAP_FLAG = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+
+def load_index(index_path: Path) -> faiss.Index:
+    """Read a FAISS index memory-mapped and read-only, so processes searching the
+    same project share its pages instead of each copying it onto the heap
+    
+    With FAISS versions that lack IO_FLAG_MMAP_IFC, only IVF indexes are
+    mapped; flat and HNSW indexes are still read onto the heap.
+    """
+    return faiss.read_index(str(index_path), MMAP_FLAG | faiss.IO_FLAG_READ_ONLY)
+
+def _create_query_embeddings(client: OpenAI, queries: List[str]) -> np.ndarray:
+    """ProjectSearch.create_query_embeddings, usable before a searcher exists"""
+    try:
+        cached = {}
+        with _query_embedding_cache_lock:
+            for query in queries:
+                key = (EMBEDDING_MODEL, query)
+                if key in _query_embedding_cache:
+                    _query_embedding_cache.move_to_end(key)
+                    cached[query] = _query_embedding_cache[key]
+        
+        missing = list(dict.fromkeys(query for query in queries if query not in cached))
+        if missing:
+            # base64 payloads decode straight into float32 buffers, skipping
+            # the per-float Python list
+            response = client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=missing,
+                encoding_format="base64"
+            )
+            
+            embeddings = np.stack([
+                np.frombuffer(base64.b64decode(data.embedding), dtype=np.float32)
+                for data in response.data
+            ])
+            # Normalize in place for cosine similarity
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+            
+            with _query_embedding_cache_lock:
+                for query, embedding in zip(missing, embeddings):
+                    embedding.setflags(write=False)
+                    cached[query] = embedding
+                    _query_embedding_cache[(EMBEDDING_MODEL, query)] = embedding
+                while len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                    _query_embedding_cache.popitem(last=False)
+        
+        return np.stack([cached[query] for query in queries])
+        
+    except Exception as e:
+        logger.error(f"Error creating query embedding: {e}")
+        raise
+
+
 class ProjectSearch:
-    def __init__(self, project_name: str, content_folder: str, openai_api_key: str):
+    def __init__(self, project_name: str, content_folder: str, openai_api_key: str,
+                 index_factory: Optional[str] = None, client: Optional[OpenAI] = None):
         """
         Initialize the project search system
         
@@ -21,13 +108,17 @@ class ProjectSearch:
             project_name: Name of the project to search
             content_folder: Path to the content folder
             openai_api_key: OpenAI API key for query embeddings
+            index_factory: Optional FAISS factory string (e.g. "SQfp16", "IVF256,SQ8")
+                used to search a compressed copy of a flat index
+            client: Optional OpenAI client to use instead of creating one
         """
         self.project_name = project_name
+        self.index_factory = index_factory
         self.content_folder = Path(content_folder)
         self.embeddings_folder = self.content_folder / project_name / "embeddings"
         
         # Initialize OpenAI client
-        self.client = OpenAI(api_key=openai_api_key)
+        self.client = client or OpenAI(api_key=openai_api_key)
         
         # Load the FAISS index and metadata
         self._load_index_and_metadata()
@@ -40,20 +131,23 @@ class ProjectSearch:
             if not index_path.exists():
                 raise FileNotFoundError(f"No embeddings index found at: {index_path}")
             
-            self.index = faiss.read_index(str(index_path))
+            self.index = load_index(index_path)
             logger.info(f"Loaded FAISS index with {self.index.ntotal} vectors")
             
-            # Load chunks metadata
-            metadata_path = self.embeddings_folder / "chunks_metadata.json"
-            if not metadata_path.exists():
-                raise FileNotFoundError(f"No metadata found at: {metadata_path}")
+            if isinstance(self.index, faiss.IndexFlat):
+                if self.index_factory:
+                    self.index = self._load_factory_index(index_path, self.index_factory)
+                elif self.index.ntotal > HNSW_MIN_VECTORS:
+                    self.index = self._load_hnsw_index(index_path)
             
-            with open(metadata_path, 'r') as f:
-                self.metadata = json.load(f)
+            # Load chunks metadata
+            self.metadata = self._load_chunks_metadata()
             
             self.chunks = self.metadata['chunks']
             logger.info(f"Loaded metadata for {len(self.chunks)} chunks")
             
+            self._build_chunk_arrays()
+            
             # Load vectorization info
             info_path = self.embeddings_folder / "vectorization_info.json"
             if info_path.exists():
@@ -61,28 +155,153 @@ class ProjectSearch:
                     self.vectorization_info = json.load(f)
             else:
                 self.vectorization_info = {}
+            
+            # Restore the search parameters the vectorizer chose for an index it built
+            if isinstance(self.index, faiss.IndexHNSW) and 'hnsw_ef_search' in self.vectorization_info:
+                self.index.hnsw.efSearch = self.vectorization_info['hnsw_ef_search']
+            elif isinstance(self.index, faiss.IndexIVF) and 'ivf_nprobe' in self.vectorization_info:
+                self.index.nprobe = self.vectorization_info['ivf_nprobe']
                 
         except Exception as e:
             logger.error(f"Error loading index and metadata: {e}")
             raise
 
-    def create_query_embedding(self, query: str) -> np.ndarray:
-        """Create embedding for a search query"""
-        try:
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=[query]
-            )
-            
-            embedding = np.array(response.data[0].embedding, dtype=np.float32)
-            # Normalize for cosine similarity
-            embedding = embedding / np.linalg.norm(embedding)
+    def _load_chunks_metadata(self) -> Dict[str, Any]:
+        """Load chunk metadata: the JSON summary plus the chunks from its JSON Lines
+        file, or a full JSON metadata file from older runs"""
+        metadata_path = self.embeddings_folder / "chunks_metadata.json"
+        
+        if not metadata_path.exists():
+            raise FileNotFoundError(f"No metadata found at: {metadata_path}")
+        
+        if orjson is not None:
+            metadata = orjson.loads(metadata_path.read_bytes())
+        else:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+        
+        if 'chunks' not in metadata:
+            # One chunk per line, line i = FAISS id i
+            loads = orjson.loads if orjson is not None else json.loads
+            with open(self.embeddings_folder / metadata['chunks_path'], 'rb') as f:
+                metadata['chunks'] = [loads(line) for line in f]
+        
+        return metadata
+
+    def _build_chunk_arrays(self):
+        """Column arrays over self.chunks (row i = FAISS id i) for vectorized filtering"""
+        self._file_paths = np.array([chunk['file_path'] for chunk in self.chunks], dtype=object)
+        
+        # Each chunk's extension as an id into self._extensions
+        suffixes = np.array([Path(file_path).suffix.lower() for file_path in self._file_paths], dtype=object)
+        self._extensions, self._ext_ids = np.unique(suffixes, return_inverse=True)
+        self._ext_ids = self._ext_ids.astype(np.int32)
+        
+        # FAISS ids of the chunks for each extension, for search-time ID selectors
+        self._ext_to_ids: Dict[str, np.ndarray] = {
+            ext: np.flatnonzero(self._ext_ids == ext_id).astype(np.int64)
+            for ext_id, ext in enumerate(self._extensions)
+        }
+
+    def _search_parameters(self, selector) -> faiss.SearchParameters:
+        """Search parameters restricting the search to selector, matching the index
+        type; a factory copy behind a transform (e.g. "PCA32,IVF4,SQ8") gets
+        the parameters of the index it wraps"""
+        index = self.index
+        if isinstance(index, faiss.IndexPreTransform):
+            index = faiss.downcast_index(index.index)
+        
+        if isinstance(index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        elif isinstance(index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        
+        if index is not self.index:
+            params = faiss.SearchParametersPreTransform(index_params=params)
+        return params
+
+    def _load_hnsw_index(self, index_path: Path) -> faiss.Index:
+        """Load, or build once from the flat index, an HNSW copy persisted next to it"""
+        hnsw_path = self.embeddings_folder / "embeddings.hnsw.index"
+        
+        if hnsw_path.exists() and hnsw_path.stat().st_mtime >= index_path.stat().st_mtime:
+            hnsw_index = load_index(hnsw_path)
+        else:
+            logger.info(f"Building HNSW index for {self.index.ntotal} vectors")
+            hnsw_index = faiss.IndexHNSWFlat(self.index.d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            hnsw_index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            hnsw_index.add(self.index.reconstruct_n(0, self.index.ntotal))
             
-            return embedding
+            try:
+                faiss.write_index(hnsw_index, str(hnsw_path))
+            except Exception as e:
+                logger.warning(f"Could not save HNSW index to {hnsw_path}: {e}")
+        
+        hnsw_index.hnsw.efSearch = HNSW_EF_SEARCH
+        logger.info(f"Using HNSW index from {hnsw_path}")
+        return hnsw_index
+
+    def _load_factory_index(self, index_path: Path, index_factory: str) -> faiss.Index:
+        """Load, or build once from the flat index, a copy described by a FAISS
+        factory string; scalar quantizers halve (fp16) or quarter (8-bit) the
+        memory read per search"""
+        suffix = ''.join(c if c.isalnum() else '_' for c in index_factory).lower()
+        factory_path = self.embeddings_folder / f"embeddings.{suffix}.index"
+        
+        if factory_path.exists() and factory_path.stat().st_mtime >= index_path.stat().st_mtime:
+            factory_index = load_index(factory_path)
+        else:
+            logger.info(f"Building {index_factory} index for {self.index.ntotal} vectors")
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            factory_index = faiss.index_factory(self.index.d, index_factory, faiss.METRIC_INNER_PRODUCT)
+            factory_index.train(vectors)
+            factory_index.add(vectors)
             
-        except Exception as e:
-            logger.error(f"Error creating query embedding: {e}")
-            raise
+            try:
+                faiss.write_index(factory_index, str(factory_path))
+            except Exception as e:
+                logger.warning(f"Could not save {index_factory} index to {factory_path}: {e}")
+        
+        # Probe as many lists as the vectorizer does, not FAISS's default of one
+        ivf_index = faiss.try_extract_index_ivf(factory_index)
+        if ivf_index is not None:
+            ivf_index.nprobe = min(IVF_NPROBE, ivf_index.nlist)
+        
+        logger.info(f"Using {index_factory} index from {factory_path}")
+        return factory_index
+
+    def create_query_embedding(self, query: str) -> np.ndarray:
+        """Create embedding for a search query"""
+        return self.create_query_embeddings([query])[0]
+
+    def create_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """
+        Create normalized embeddings for several queries
+        
+        Cached queries are served from memory and the rest are sent in a single
+        embeddings request.
+        
+        Returns:
+            (len(queries), dimension) float32 matrix
+        """
+        return _create_query_embeddings(self.client, queries)
+
+    def _collect_results(self, scores: np.ndarray, indices: np.ndarray, score_threshold: float) -> List[Dict[str, Any]]:
+        """Turn one row of FAISS scores/indices into result chunks"""
+        results = []
+        for i, (score, idx) in enumerate(zip(scores, indices)):
+            if score < score_threshold:
+                continue
+                
+            if 0 <= idx < len(self.chunks):
+                chunk = self.chunks[idx].copy()
+                chunk['similarity_score'] = float(score)
+                chunk['rank'] = i + 1
+                results.append(chunk)
+        
+        return results
 
     def search(self, query: str, top_k: int = 5, score_threshold: float = 0.0) -> List[Dict[str, Any]]:
         """
@@ -96,46 +315,73 @@ class ProjectSearch:
         Returns:
             List of relevant chunks with metadata and scores
         """
+        return self.search_batch([query], top_k, score_threshold)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 5, score_threshold: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one embeddings request and one FAISS call
+        
+        Returns:
+            One result list per query, in the same order as queries
+        """
         try:
-            # Create query embedding
-            query_embedding = self.create_query_embedding(query)
+            # Create query embeddings
+            query_embeddings = self.create_query_embeddings(queries)
             
             # Search the index
-            scores, indices = self.index.search(query_embedding.reshape(1, -1), top_k)
-            
-            results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if score < score_threshold:
-                    continue
-                    
-                if idx < len(self.chunks):
-                    chunk = self.chunks[idx].copy()
-                    chunk['similarity_score'] = float(score)
-                    chunk['rank'] = i + 1
-                    results.append(chunk)
+            scores, indices = self.index.search(query_embeddings, top_k)
             
-            return results
+            return [
+                self._collect_results(row_scores, row_indices, score_threshold)
+                for row_scores, row_indices in zip(scores, indices)
+            ]
             
         except Exception as e:
             logger.error(f"Error during search: {e}")
             raise
 
-    def search_by_file_extension(self, query: str, file_extensions: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search within specific file types"""
-        all_results = self.search(query, top_k * 3)  # Get more results to filter
+    def search_stream(self, queries: Iterable[str], top_k: int = 5,
+                      score_threshold: float = 0.0) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Search queries one after another, embedding the next query in the
+        background while the current one is searched and its results built
         
-        filtered_results = []
-        for result in all_results:
-            file_path = result['file_path']
-            file_ext = Path(file_path).suffix.lower()
+        Yields:
+            (query, results) pairs in input order
+        """
+        queries = iter(queries)
+        done = object()
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            query = next(queries, done)
+            future = executor.submit(self.create_query_embedding, query) if query is not done else None
             
-            if file_ext in file_extensions:
-                filtered_results.append(result)
+            while future is not None:
+                query_embedding = future.result()
+                current_query = query
                 
-            if len(filtered_results) >= top_k:
-                break
+                # Start the next network round trip before doing the FAISS work
+                query = next(queries, done)
+                future = executor.submit(self.create_query_embedding, query) if query is not done else None
                 
-        return filtered_results
+                scores, indices = self.index.search(query_embedding.reshape(1, -1), top_k)
+                yield current_query, self._collect_results(scores[0], indices[0], score_threshold)
+
+    def search_by_file_extension(self, query: str, file_extensions: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
+        """Search within specific file types"""
+        id_arrays = [self._ext_to_ids[ext] for ext in file_extensions if ext in self._ext_to_ids]
+        if not id_arrays:
+            return []
+        
+        # Only the chunks of the requested file types are scored, so the
+        # returned top_k is exact instead of a filtered oversample
+        ids = np.concatenate(id_arrays)
+        selector = faiss.IDSelectorBatch(ids.size, faiss.swig_ptr(ids))
+        
+        query_embedding = self.create_query_embeddings([query])
+        scores, indices = self.index.search(query_embedding, top_k, params=self._search_parameters(selector))
+        
+        return self._collect_results(scores[0], indices[0], 0.0)
 
     def get_project_summary(self) -> Dict[str, Any]:
         """Get a summary of the vectorized project"""
@@ -150,21 +396,18 @@ class ProjectSearch:
 
     def _get_files_by_extension(self) -> Dict[str, int]:
         """Get count of files by extension"""
-        extension_counts = {}
-        processed_files = set()
-        
-        for chunk in self.chunks:
-            file_path = chunk['file_path']
-            if file_path not in processed_files:
-                processed_files.add(file_path)
-                ext = Path(file_path).suffix.lower()
-                extension_counts[ext] = extension_counts.get(ext, 0) + 1
-                
-        return extension_counts
+        if not len(self._file_paths):
+            return {}
+        
+        # One row per distinct file, then count its extension ids
+        _, first_rows = np.unique(self._file_paths, return_index=True)
+        counts = np.bincount(self._ext_ids[first_rows], minlength=len(self._extensions))
+        
+        return {ext: int(count) for ext, count in zip(self._extensions, counts) if count}
 
     def get_file_chunks(self, file_path: str) -> List[Dict[str, Any]]:
         """Get all chunks for a specific file"""
-        return [chunk for chunk in self.chunks if chunk['file_path'] == file_path]
+        return [self.chunks[idx] for idx in np.flatnonzero(self._file_paths == file_path)]
 
 
 def search_similar_content(query: str, embeddings_path: str, k: int = 5, openai_api_key: str = None) -> List[Dict[str, Any]]:
@@ -193,12 +436,20 @@ def search_similar_content(query: str, embeddings_path: str, k: int = 5, openai_
         project_name = embeddings_path.parent.name
         content_folder = embeddings_path.parent.parent
         
-        # Create searcher instance and perform search
-        searcher = ProjectSearch(
-            project_name=project_name,
-            content_folder=str(content_folder),
-            openai_api_key=openai_api_key
-        )
+        client = OpenAI(api_key=openai_api_key)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Send the query embedding request first and load the index from
+            # disk while it is in flight; search() then finds it in the cache
+            query_embedding = executor.submit(_create_query_embeddings, client, [query])
+            
+            # Create searcher instance and perform search
+            searcher = ProjectSearch(
+                project_name=project_name,
+                content_folder=str(content_folder),
+                openai_api_key=openai_api_key,
+                client=client
+            )
+            query_embedding.result()
         
         return searcher.search(query, top_k=k)
         
@@ -219,6 +470,7 @@ def main():
     parser.add_argument("query", help="Search query")
     parser.add_argument("--top-k", type=int, default=5, help="Number of results to return")
     parser.add_argument("--threshold", type=float, default=0.0, help="Minimum similarity score")
+    parser.add_argument("--index-factory", default=None, help="FAISS factory string for a compressed index, e.g. SQfp16")
     
     args = parser.parse_args()
     
@@ -226,7 +478,8 @@ def main():
         searcher = ProjectSearch(
             project_name=args.project_name,
             content_folder=args.content_folder,
-            openai_api_key=args.openai_api_key
+            openai_api_key=args.openai_api_key,
+            index_factory=args.index_factory
         )
         
         results = searcher.search(args.query, args.top_k, args.threshold)
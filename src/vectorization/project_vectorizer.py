@@ -1,19 +1,245 @@
 import os
 import json
+import codecs
+import time
+import random
+import string
+import hashlib
+import asyncio
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from collections import deque
 from pathlib import Path
 import numpy as np
 import faiss
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
 import tiktoken
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Union, BinaryIO
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Let index building and batched search use every core
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Embedding requests are network bound, so several run at once
+MAX_CONCURRENT_REQUESTS = 8
+
+# Batches are packed by token count, within the embeddings API's per-request limits
+MAX_BATCH_TOKENS = 250_000
+MAX_BATCH_ITEMS = 2048
+
+# Requests are throttled to the account's embeddings rate limits (tier 1 by
+# default) instead of bouncing off 429s
+REQUESTS_PER_MINUTE = 3_000
+TOKENS_PER_MINUTE = 1_000_000
+
+# Transient API failures are retried with exponential backoff and jitter
+MAX_ATTEMPTS = 6
+RETRY_INITIAL_DELAY = 1.0  # seconds
+RETRY_MAX_DELAY = 60.0  # seconds
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+ENCODING_NAME = "cl100k_base"
+
+# Larger projects get an HNSW index (sublinear search) instead of an exact
+# flat one; same threshold and parameters ProjectSearch uses for its copies
+HNSW_MIN_VECTORS = 50_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# The largest get an IVF index with 8-bit scalar quantized vectors, a quarter
+# of the float32 size on disk and in memory
+IVF_SQ8_MIN_VECTORS = 200_000
+IVF_NPROBE = 16
+
+# Embeddings of unchanged chunks are reused across runs, keyed by a hash of their tokens
+CHUNK_KEY_SIZE = 16  # bytes
+
+# Chunks shorter than this, or mostly whitespace and punctuation (empty tails,
+# separator banners, lockfile fragments), aren't worth an embedding
+MIN_CHUNK_TOKENS = 32
+MIN_CONTENT_RATIO = 0.1
+_FILLER_CHARS = str.maketrans('', '', string.whitespace + string.punctuation)
+
+# Reading and tokenizing is CPU bound; below this many files, starting worker
+# processes costs more than it saves
+PROCESS_POOL_MIN_FILES = 32
+FILES_PER_TASK = 16
+
+# Groups submitted ahead of the one being consumed, per worker; enough to keep
+# the workers busy without piling up the token lists of the whole project
+TASKS_IN_FLIGHT_PER_WORKER = 2
+
+# Processed files waiting for their chunks to be written and queued for embedding
+PIPELINE_QUEUE_SIZE = 64
+
+def _read_file_content(file_path: Path) -> Optional[str]:
+    """Read and return file content"""
+    try:
+        # Read once and decode in memory instead of reopening per encoding
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        
+        # Byte order marks name their encoding
+        if raw.startswith(codecs.BOM_UTF8):
+            content = raw.decode('utf-8-sig', errors='replace')
+        elif raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            content = raw.decode('utf-16', errors='replace')
+        else:
+            try:
+                content = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                # Legacy 8-bit text; latin-1 maps every byte, so this can't fail
+                content = raw.decode('latin-1')
+        
+        # Universal newlines, as text mode reads gave
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return content
+        
+    except Exception as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return None
+
+
+def _slice_tokens(tokens: List[int], file_path: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """Split already encoded text into overlapping chunks"""
+    windows = []
+    
+    start = 0
+    while start < len(tokens):
+        # Calculate end position
+        end = min(start + chunk_size, len(tokens))
+        windows.append((start, end))
+        
+        # If we're at the end, break
+        if end >= len(tokens):
+            break
+        
+        # Move start position for next chunk (with overlap)
+        start = end - chunk_overlap
+    
+    return [
+        {
+            'id': f"{file_path}_{chunk_id}",
+            'file_path': file_path,
+            'chunk_id': chunk_id,
+            # Embedded as token ids; decoded to 'text' only when metadata is saved
+            'tokens': tokens[start:end],
+            'start_token': start,
+            'end_token': end,
+            'token_count': end - start
+        }
+        for chunk_id, (start, end) in enumerate(windows)
+    ]
+
+
+def _process_files(file_paths: List[Path], project_path: Path, chunk_size: int, chunk_overlap: int,
+                   num_threads: int = 1) -> List[Optional[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]]:
+    """
+    Read, tokenize and chunk a group of files
+    
+    Module level so ProcessPoolExecutor workers can run it. The group is
+    tokenized with one encode_batch call, which runs tiktoken's BPE on
+    num_threads threads.
+    
+    Returns:
+        (relative_path, chunks, file_stats entry) per file, or None for files
+        that can't be read
+    """
+    # get_encoding caches the encoder per process
+    tokenizer = tiktoken.get_encoding(ENCODING_NAME)
+    
+    # Read file contents
+    contents = [_read_file_content(file_path) for file_path in file_paths]
+    readable = [i for i, content in enumerate(contents) if content is not None]
+    token_lists = tokenizer.encode_batch([contents[i] for i in readable], num_threads=num_threads)
+    
+    results = [None] * len(file_paths)
+    for i, tokens in zip(readable, token_lists):
+        file_path = file_paths[i]
+        relative_path = str(file_path.relative_to(project_path))
+        
+        # Split into chunks
+        chunks = _slice_tokens(tokens, relative_path, chunk_size, chunk_overlap)
+        
+        stats = {
+            'size_bytes': file_path.stat().st_size,
+            'chunk_count': len(chunks),
+            'extension': file_path.suffix
+        }
+        results[i] = (relative_path, chunks, stats)
+    
+    return results
+
+
+def _has_content(chunk_text: str, token_count: int) -> bool:
+    """Check that a chunk is long enough and not mostly whitespace or punctuation"""
+    if token_count < MIN_CHUNK_TOKENS:
+        return False
+    return len(chunk_text.translate(_FILLER_CHARS)) >= MIN_CONTENT_RATIO * len(chunk_text)
+
+
+def _chunk_key(tokens: List[int]) -> bytes:
+    """Hash of a chunk's token ids, the embedding cache key"""
+    return hashlib.blake2b(np.asarray(tokens, dtype=np.uint32).tobytes(), digest_size=CHUNK_KEY_SIZE).digest()
+
+
+def _write_json(data: Any, file_path: Path):
+    """Write data as indented JSON, with orjson when it's installed"""
+    if orjson is not None:
+        file_path.write_bytes(orjson.dumps(
+            data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY
+        ))
+    else:
+        with open(file_path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def _json_line(record: Dict[str, Any]) -> bytes:
+    """Encode one JSON Lines record"""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record) + '\n').encode('utf-8')
+
+
+class _RateLimiter:
+    """Async token bucket refilling capacity units per period seconds"""
+    
+    def __init__(self, capacity: int, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.available = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self, amount: int = 1):
+        """Wait until amount units are available and take them"""
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((amount - self.available) / self.rate)
+
+
 class ProjectVectorizer:
-    def __init__(self, project_path: str, content_folder: str, openai_api_key: str):
+    def __init__(self, project_path: str, content_folder: str, openai_api_key: str, use_gpu: bool = False):
         """
         Initialize the project vectorizer
         
@@ -21,6 +247,7 @@ class ProjectVectorizer:
             project_path: Path to the project to vectorize
             content_folder: Path to the content folder where embeddings will be stored
             openai_api_key: OpenAI API key for embeddings
+            use_gpu: Train and fill IVF indexes on the available GPUs (needs faiss-gpu)
         """
         self.project_path = Path(project_path)
         self.content_folder = Path(content_folder)
@@ -30,11 +257,16 @@ class ProjectVectorizer:
         # Create embeddings folder if it doesn't exist
         self.embeddings_folder.mkdir(parents=True, exist_ok=True)
         
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=openai_api_key)
+        # Initialize OpenAI client (async, so embedding batches can overlap).
+        # create_embeddings does its own retries with longer backoff.
+        self.client = AsyncOpenAI(api_key=openai_api_key, max_retries=0)
+        
+        # FAISS index, set by vectorize_project
+        self.index = None
+        self.use_gpu = use_gpu
         
         # Initialize tokenizer for chunk splitting
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.tokenizer = tiktoken.get_encoding(ENCODING_NAME)
         
         # Chunk settings
         self.chunk_size = 1000  # tokens
@@ -48,6 +280,9 @@ class ProjectVectorizer:
             '.swift', '.kt', '.scala', '.r', '.m', '.mm', '.dart', '.vue', '.svelte'
         }
         
+        # Tuple for str.endswith, which tests every suffix in one C call
+        self._extension_suffixes = tuple(sorted(self.text_extensions))
+        
         # Directories to ignore
         self.ignore_dirs = {
             'node_modules', '.git', '.svn', '.hg', '__pycache__', '.pytest_cache',
@@ -60,204 +295,486 @@ class ProjectVectorizer:
             '.gitignore', '.gitattributes', '.env', '.env.local', '.env.production',
             'package-lock.json', 'yarn.lock', 'Pipfile.lock', 'poetry.lock'
         }
+        
+        # Files share directories, so whether a directory is ignored is cached
+        self._is_ignored_dir = lru_cache(maxsize=4096)(self._check_ignored_dir)
 
     def should_process_file(self, file_path: Path) -> bool:
         """Check if a file should be processed"""
-        # Check if file extension is supported
-        if file_path.suffix.lower() not in self.text_extensions:
-            return False
-            
-        # Check if file is in ignore list
-        if file_path.name in self.ignore_files:
+        if not self._should_process_name(file_path.name):
             return False
-            
+        
         # Check if any parent directory is in ignore list
-        for parent in file_path.parents:
-            if parent.name in self.ignore_dirs:
-                return False
-                
-        return True
+        return not self._is_ignored_dir(file_path.parent)
 
-    def read_file_content(self, file_path: Path) -> Optional[str]:
-        """Read and return file content"""
+    def _should_process_name(self, name: str) -> bool:
+        """Check a file name against the supported extensions and ignored files"""
+        # Check if file extension is supported; the extensions are lowercase,
+        # so only names that miss are lowercased and checked again
+        if not (name.endswith(self._extension_suffixes) or name.lower().endswith(self._extension_suffixes)):
+            return False
+        
+        # Check if file is in ignore list
+        return name not in self.ignore_files
+
+    def _check_ignored_dir(self, directory: Path) -> bool:
+        """Check if directory is, or is inside, an ignored directory of the project"""
         try:
-            # Try different encodings
-            encodings = ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']
+            parts = directory.relative_to(self.project_path).parts
+        except ValueError:
+            parts = directory.parts
+        return any(part in self.ignore_dirs for part in parts)
+
+    def _iter_files(self, root: Path) -> Iterator[Path]:
+        """Yield files under root that should be processed, pruning ignored
+        directories at the dirent level so their contents are never listed"""
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as e:
+                logger.warning(f"Could not list directory {directory}: {e}")
+                continue
             
-            for encoding in encodings:
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.ignore_dirs:
+                                stack.append(entry.path)
+                        elif entry.is_file() and self._should_process_name(entry.name):
+                            # Ignored directories were already pruned
+                            yield Path(entry.path)
+                    except OSError:
+                        continue
+
+    def _iter_processed_files(self, file_paths: List[Path]) -> Iterator[Tuple[str, List[Dict[str, Any]], Dict[str, Any]]]:
+        """Read, tokenize and chunk files, in worker processes for larger projects,
+        yielding (relative_path, chunks, stats) in walk order and skipping unreadable files"""
+        workers = os.cpu_count() or 1
+        if len(file_paths) >= PROCESS_POOL_MIN_FILES and workers > 1:
+            # Groups are submitted through a sliding window as results are
+            # consumed, so a slow consumer holds back the workers
+            max_in_flight = workers * TASKS_IN_FLIGHT_PER_WORKER
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
                 try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        return f.read()
-                except UnicodeDecodeError:
-                    continue
+                    for i in range(0, len(file_paths), FILES_PER_TASK):
+                        pending.append(executor.submit(
+                            _process_files, file_paths[i:i + FILES_PER_TASK], self.project_path,
+                            self.chunk_size, self.chunk_overlap
+                        ))
+                        if len(pending) >= max_in_flight:
+                            yield from filter(None, pending.popleft().result())
                     
-            logger.warning(f"Could not decode file: {file_path}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error reading file {file_path}: {e}")
-            return None
+                    while pending:
+                        yield from filter(None, pending.popleft().result())
+                finally:
+                    # Closed early: don't wait for groups that haven't started
+                    for future in pending:
+                        future.cancel()
+        else:
+            yield from filter(None, _process_files(
+                file_paths, self.project_path, self.chunk_size, self.chunk_overlap,
+                num_threads=os.cpu_count() or 1
+            ))
+
+    def read_file_content(self, file_path: Path) -> Optional[str]:
+        """Read and return file content"""
+        return _read_file_content(file_path)
 
     def split_text_into_chunks(self, text: str, file_path: str) -> List[Dict[str, Any]]:
         """Split text into overlapping chunks"""
         tokens = self.tokenizer.encode(text)
-        chunks = []
-        
-        start = 0
-        chunk_id = 0
-        
-        while start < len(tokens):
-            # Calculate end position
-            end = min(start + self.chunk_size, len(tokens))
-            
-            # Get chunk tokens
-            chunk_tokens = tokens[start:end]
-            chunk_text = self.tokenizer.decode(chunk_tokens)
-            
-            # Create chunk metadata
-            chunk = {
-                'id': f"{file_path}_{chunk_id}",
-                'file_path': file_path,
-                'chunk_id': chunk_id,
-                'text': chunk_text,
-                'start_token': start,
-                'end_token': end,
-                'token_count': len(chunk_tokens)
-            }
-            
-            chunks.append(chunk)
-            chunk_id += 1
-            
-            # Move start position for next chunk (with overlap)
-            start = end - self.chunk_overlap
-            
-            # If we're at the end, break
-            if end >= len(tokens):
-                break
-                
-        return chunks
+        return _slice_tokens(tokens, file_path, self.chunk_size, self.chunk_overlap)
 
-    def create_embeddings(self, texts: List[str]) -> np.ndarray:
-        """Create embeddings for a list of texts"""
+    async def create_embeddings(self, inputs: List[Union[str, List[int]]]) -> np.ndarray:
+        """Create L2-normalized embeddings for a list of texts or token id lists,
+        retrying rate limit, connection and server errors with exponential backoff"""
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=texts
-            )
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                try:
+                    response = await self.client.embeddings.create(
+                        model=EMBEDDING_MODEL,
+                        input=inputs
+                    )
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt == MAX_ATTEMPTS:
+                        raise
+                    delay = min(RETRY_MAX_DELAY, RETRY_INITIAL_DELAY * 2 ** (attempt - 1)) + random.uniform(0, 1)
+                    logger.warning(f"Embedding request failed ({e}), retrying in {delay:.1f}s "
+                                   f"(attempt {attempt}/{MAX_ATTEMPTS})")
+                    await asyncio.sleep(delay)
             
-            embeddings = []
-            for data in response.data:
-                embeddings.append(data.embedding)
-                
-            return np.array(embeddings, dtype=np.float32)
+            embeddings = np.array([data.embedding for data in response.data], dtype=np.float32)
+            
+            # Normalize for cosine similarity while the batch is still in cache
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True).clip(min=1e-12)
+            return embeddings
             
         except Exception as e:
             logger.error(f"Error creating embeddings: {e}")
             raise
 
-    def vectorize_project(self) -> Dict[str, Any]:
-        """Vectorize the entire project"""
-        logger.info(f"Starting vectorization of project: {self.project_path}")
+    async def _embed_batches(self, batch_queue: asyncio.Queue, request_limiter: _RateLimiter,
+                             token_limiter: _RateLimiter, new_embeddings: Dict[bytes, np.ndarray]):
+        """Embedding worker: send (batch_number, chunk_keys, chunk_tokens) batches
+        from batch_queue until it gets None, storing embeddings by chunk key"""
+        while True:
+            batch = await batch_queue.get()
+            if batch is None:
+                return
+            
+            batch_number, keys, inputs = batch
+            await request_limiter.acquire()
+            await token_limiter.acquire(sum(len(tokens) for tokens in inputs))
+            logger.info(f"Creating embeddings for batch {batch_number} ({len(inputs)} chunks)")
+            embeddings = await self.create_embeddings(inputs)
+            new_embeddings.update(zip(keys, embeddings))
+
+    async def _process_and_embed(self, file_paths: List[Path], chunks_file: BinaryIO,
+                                 embedding_cache: Dict[bytes, np.ndarray]
+                                 ) -> Tuple[List[bytes], Dict[str, Any], Dict[bytes, np.ndarray]]:
+        """
+        Chunk the files and embed new chunks as a pipeline, so embedding requests
+        start while later files are still being read and tokenized:
         
-        # Collect all files to process
-        all_chunks = []
-        file_stats = {}
+        - a reader pulls processed files from _iter_processed_files on a thread
+          into files_queue
+        - a writer streams each file's chunk metadata to chunks_file and packs
+          chunks that aren't cached into batches on batch_queue, by token count
+          within the embeddings API's per-request limits; identical chunks
+          (copied boilerplate, vendored files) go out once
+        - MAX_CONCURRENT_REQUESTS workers embed the batches, throttled to the
+          rate limits
         
-        # Walk through project directory
-        for file_path in self.project_path.rglob("*"):
-            if file_path.is_file() and self.should_process_file(file_path):
-                relative_path = str(file_path.relative_to(self.project_path))
+        Both queues are bounded, so a slow stage holds back the ones feeding it,
+        and None ends each of them. The reader only advances the generator when
+        files_queue has room, and the generator only submits file groups to its
+        workers as results are taken, so backpressure reaches the worker
+        processes too. If any stage fails the others are cancelled.
+        
+        Returns:
+            (key of every chunk in FAISS row order, file stats, new embeddings by chunk key)
+        """
+        loop = asyncio.get_running_loop()
+        files_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        batch_queue = asyncio.Queue(maxsize=MAX_CONCURRENT_REQUESTS)
+        request_limiter = _RateLimiter(REQUESTS_PER_MINUTE)
+        token_limiter = _RateLimiter(TOKENS_PER_MINUTE)
+        new_embeddings = {}
+        
+        async def read_files():
+            processed_files = self._iter_processed_files(file_paths)
+            # One thread, as a generator can't be advanced from two at once
+            reader = ThreadPoolExecutor(max_workers=1)
+            try:
+                while True:
+                    processed = await loop.run_in_executor(reader, next, processed_files, None)
+                    if processed is None:
+                        break
+                    await files_queue.put(processed)
+            finally:
+                # Closing cancels file groups that haven't started. It's queued on
+                # the reader thread, behind any next() still running there, so a
+                # cancelled pipeline doesn't block the event loop on it.
+                reader.submit(processed_files.close)
+                reader.shutdown(wait=False)
+            await files_queue.put(None)
+        
+        async def write_chunks() -> Tuple[List[bytes], Dict[str, Any]]:
+            chunk_keys = []
+            file_stats = {}
+            queued_keys = set()
+            batch_keys, batch_tokens, batch_token_count = [], [], 0
+            batch_number = 0
+            
+            while True:
+                processed = await files_queue.get()
+                if processed is None:
+                    break
                 
-                # Read file content
-                content = self.read_file_content(file_path)
-                if content is None:
-                    continue
+                relative_path, chunks, stats = processed
+                chunk_texts = self.tokenizer.decode_batch([chunk['tokens'] for chunk in chunks])
+                kept = 0
+                for chunk, chunk_text in zip(chunks, chunk_texts):
+                    # Near-empty chunks are dropped from both the index and the metadata
+                    if not _has_content(chunk_text, chunk['token_count']):
+                        continue
+                    tokens = chunk.pop('tokens')
+                    key = _chunk_key(tokens)
+                    chunk_keys.append(key)
+                    chunk['text'] = chunk_text
+                    chunks_file.write(_json_line(chunk))
+                    kept += 1
                     
-                # Split into chunks
-                chunks = self.split_text_into_chunks(content, relative_path)
-                all_chunks.extend(chunks)
-                
-                file_stats[relative_path] = {
-                    'size_bytes': file_path.stat().st_size,
-                    'chunk_count': len(chunks),
-                    'extension': file_path.suffix
-                }
+                    # Chunks embedded by the previous run, or already queued, aren't sent again
+                    if key in embedding_cache or key in queued_keys:
+                        continue
+                    queued_keys.add(key)
+                    
+                    if batch_keys and (batch_token_count + len(tokens) > MAX_BATCH_TOKENS or
+                                       len(batch_keys) >= MAX_BATCH_ITEMS):
+                        batch_number += 1
+                        await batch_queue.put((batch_number, batch_keys, batch_tokens))
+                        batch_keys, batch_tokens, batch_token_count = [], [], 0
+                    # Chunks are sent as token ids, so the API doesn't re-tokenize decoded text
+                    batch_keys.append(key)
+                    batch_tokens.append(tokens)
+                    batch_token_count += len(tokens)
                 
-                logger.info(f"Processed {relative_path}: {len(chunks)} chunks")
+                stats['chunk_count'] = kept
+                file_stats[relative_path] = stats
+                logger.info(f"Processed {relative_path}: {kept} chunks")
+            
+            if batch_keys:
+                batch_number += 1
+                await batch_queue.put((batch_number, batch_keys, batch_tokens))
+            for _ in range(MAX_CONCURRENT_REQUESTS):
+                await batch_queue.put(None)
+            return chunk_keys, file_stats
         
-        if not all_chunks:
-            logger.warning("No files found to vectorize")
-            return {"status": "no_files", "message": "No supported files found in project"}
+        writer = asyncio.ensure_future(write_chunks())
+        tasks = [asyncio.ensure_future(read_files()), writer] + [
+            asyncio.ensure_future(self._embed_batches(batch_queue, request_limiter, token_limiter, new_embeddings))
+            for _ in range(MAX_CONCURRENT_REQUESTS)
+        ]
         
-        logger.info(f"Total chunks to embed: {len(all_chunks)}")
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Create embeddings in batches
-        batch_size = 100
-        all_embeddings = []
+        # Raise the failure, if any
+        for task in done:
+            task.result()
         
-        for i in range(0, len(all_chunks), batch_size):
-            batch_chunks = all_chunks[i:i + batch_size]
-            batch_texts = [chunk['text'] for chunk in batch_chunks]
+        chunk_keys, file_stats = writer.result()
+        return chunk_keys, file_stats, new_embeddings
+
+    def _load_embedding_cache(self) -> Dict[bytes, np.ndarray]:
+        """Embeddings from the previous run keyed by chunk hash, empty if there
+        is no cache for the current model
+        
+        Row i of the cache is row i of the previous index. Exact (flat and
+        HNSW) indexes hold the vectors themselves, so only the keys are
+        cached and the vectors are read back from the index. An IVF-SQ8
+        index only holds 8-bit approximations, which would lose more
+        precision on every rerun, so the cache keeps fp16 copies for it.
+        """
+        cache_path = self.embeddings_folder / "embeddings_cache.npz"
+        index_path = self.embeddings_folder / "embeddings.index"
+        if not cache_path.exists():
+            return {}
+        
+        try:
+            with np.load(cache_path) as cache:
+                if str(cache['model']) != EMBEDDING_MODEL:
+                    return {}
+                keys = cache['keys']
+                embeddings = cache['embeddings'] if 'embeddings' in cache.files else None
             
-            logger.info(f"Creating embeddings for batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
-            batch_embeddings = self.create_embeddings(batch_texts)
-            all_embeddings.append(batch_embeddings)
+            if embeddings is not None:
+                # Undo the fp16 rounding of the norms
+                embeddings = embeddings.astype(np.float32)
+                embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True).clip(min=1e-12)
+            else:
+                index = faiss.read_index(str(index_path))
+                if faiss.try_extract_index_ivf(index) is not None or index.ntotal != len(keys):
+                    logger.warning(f"Ignoring embeddings cache {cache_path}: it doesn't match {index_path}")
+                    return {}
+                embeddings = index.reconstruct_n(0, index.ntotal)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embeddings cache {cache_path}: {e}")
+            return {}
         
-        # Combine all embeddings
-        embeddings_matrix = np.vstack(all_embeddings)
+        return {key.tobytes(): embedding for key, embedding in zip(keys, embeddings)}
+
+    def _save_embedding_cache(self, chunk_keys: List[bytes], embeddings_matrix: np.ndarray, lossy_index: bool):
+        """Persist this run's chunk keys, in index row order, for the next run,
+        with fp16 copies of the embeddings when the index can't give them back"""
+        cache_path = self.embeddings_folder / "embeddings_cache.npz"
+        partial_cache_path = self.embeddings_folder / "embeddings_cache.partial.npz"
+        
+        arrays = {
+            'model': np.array(EMBEDDING_MODEL),
+            'keys': np.frombuffer(b''.join(chunk_keys), dtype=np.uint8).reshape(len(chunk_keys), CHUNK_KEY_SIZE)
+        }
+        if lossy_index:
+            arrays['embeddings'] = embeddings_matrix.astype(np.float16)
         
-        # Create FAISS index
+        try:
+            with open(partial_cache_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(partial_cache_path, cache_path)
+        except BaseException:
+            partial_cache_path.unlink(missing_ok=True)
+            raise
+
+    def _build_index(self, embeddings_matrix: np.ndarray) -> Tuple[faiss.Index, Dict[str, Any]]:
+        """
+        Build an inner product (cosine similarity) index over normalized embeddings
+        
+        Returns:
+            (index, parameters to record in vectorization_info)
+        """
         dimension = embeddings_matrix.shape[1]
-        index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
         
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings_matrix)
+        if len(embeddings_matrix) > IVF_SQ8_MIN_VECTORS:
+            nlist = int(4 * np.sqrt(len(embeddings_matrix)))
+            quantizer = faiss.IndexFlatIP(dimension)
+            index = faiss.IndexIVFScalarQuantizer(
+                quantizer, dimension, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+            
+            if self.use_gpu and faiss.get_num_gpus() > 0:
+                # k-means training and assignment are where IVF builds spend their
+                # time, and both run much faster on GPU. Flat and HNSW indexes
+                # gain nothing from the round trip, so they stay on CPU.
+                logger.info(f"Building IVF index on {faiss.get_num_gpus()} GPU(s)")
+                gpu_index = faiss.index_cpu_to_all_gpus(index)
+                gpu_index.train(embeddings_matrix)
+                gpu_index.add(embeddings_matrix)
+                index = faiss.index_gpu_to_cpu(gpu_index)
+            else:
+                index.train(embeddings_matrix)
+                index.add(embeddings_matrix)
+            index.nprobe = IVF_NPROBE
+            index_params = {
+                'index_type': 'ivf_sq8',
+                'ivf_nlist': nlist,
+                'ivf_nprobe': IVF_NPROBE
+            }
+        elif len(embeddings_matrix) > HNSW_MIN_VECTORS:
+            index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            index.add(embeddings_matrix)
+            index_params = {
+                'index_type': 'hnsw',
+                'hnsw_m': HNSW_M,
+                'hnsw_ef_construction': HNSW_EF_CONSTRUCTION,
+                'hnsw_ef_search': HNSW_EF_SEARCH
+            }
+        else:
+            index = faiss.IndexFlatIP(dimension)
+            index.add(embeddings_matrix)
+            index_params = {'index_type': 'flat'}
         
-        # Add embeddings to index
-        index.add(embeddings_matrix)
+        return index, index_params
+
+    def search_batch(self, query_vecs: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index built by vectorize_project for many query embeddings at once
         
-        # Save FAISS index
-        index_path = self.embeddings_folder / "embeddings.index"
-        faiss.write_index(index, str(index_path))
+        FAISS only parallelizes across the queries of one call, and batches of
+        queries go through its BLAS path, so prefer this to one call per query.
+        
+        Returns:
+            (scores, ids), each (len(query_vecs), k); ids are chunk rows, -1 when
+            fewer than k chunks matched
+        """
+        if self.index is None:
+            raise RuntimeError("No index to search, run vectorize_project first")
+        
+        # Copy, then normalize in place for cosine similarity
+        queries = np.array(query_vecs, dtype=np.float32, ndmin=2)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+        return self.index.search(queries, k)
+
+    def vectorize_project(self) -> Dict[str, Any]:
+        """Vectorize the entire project"""
+        logger.info(f"Starting vectorization of project: {self.project_path}")
+        
+        # Walk through project directory
+        file_paths = list(self._iter_files(self.project_path))
+        
+        # Chunk metadata is streamed to disk file by file while new chunks are
+        # embedded, so token ids only stay in memory until their batch is sent.
+        # It's renamed into place once the index is written.
+        chunks_path = self.embeddings_folder / "chunks_metadata.jsonl"
+        partial_chunks_path = self.embeddings_folder / "chunks_metadata.jsonl.partial"
+        embedding_cache = self._load_embedding_cache()
+        try:
+            with open(partial_chunks_path, 'wb') as chunks_file:
+                chunk_keys, file_stats, new_embeddings = asyncio.run(
+                    self._process_and_embed(file_paths, chunks_file, embedding_cache)
+                )
+            
+            if not chunk_keys:
+                partial_chunks_path.unlink()
+                logger.warning("No files found to vectorize")
+                return {"status": "no_files", "message": "No supported files found in project"}
+            
+            logger.info(f"Total chunks: {len(chunk_keys)}, embedded {len(new_embeddings)} new unique chunks, "
+                        f"the rest cached or duplicates")
+            
+            # Gather cached, new and duplicated rows into chunk order
+            embedding_cache.update(new_embeddings)
+            embeddings_matrix = np.stack([embedding_cache[key] for key in chunk_keys])
+            
+            # Create FAISS index and add embeddings to it
+            dimension = embeddings_matrix.shape[1]
+            index, index_params = self._build_index(embeddings_matrix)
+            self.index = index
+            
+            # The cache's keys describe the rows of the index being replaced
+            (self.embeddings_folder / "embeddings_cache.npz").unlink(missing_ok=True)
+            
+            # Save FAISS index, uncompressed so ProjectSearch can memory-map it
+            index_path = self.embeddings_folder / "embeddings.index"
+            faiss.write_index(index, str(index_path))
+            
+            os.replace(partial_chunks_path, chunks_path)
+        except BaseException:
+            # Don't leave half-written metadata behind when a stage fails
+            partial_chunks_path.unlink(missing_ok=True)
+            raise
+        
+        self._save_embedding_cache(chunk_keys, embeddings_matrix,
+                                   lossy_index=index_params['index_type'] == 'ivf_sq8')
         
-        # Save chunks metadata
+        # Save the chunks metadata summary; the chunks themselves are in chunks_path
         chunks_metadata = {
-            'chunks': all_chunks,
-            'total_chunks': len(all_chunks),
+            'total_chunks': len(chunk_keys),
             'embedding_dimension': dimension,
             'project_path': str(self.project_path),
-            'project_name': self.project_name
+            'project_name': self.project_name,
+            'chunks_path': chunks_path.name
         }
         
         metadata_path = self.embeddings_folder / "chunks_metadata.json"
-        with open(metadata_path, 'w') as f:
-            json.dump(chunks_metadata, f, indent=2)
+        _write_json(chunks_metadata, metadata_path)
         
         # Save file statistics
         stats_path = self.embeddings_folder / "file_stats.json"
-        with open(stats_path, 'w') as f:
-            json.dump(file_stats, f, indent=2)
+        _write_json(file_stats, stats_path)
         
         # Save vectorization info
         vectorization_info = {
             'status': 'completed',
             'total_files': len(file_stats),
-            'total_chunks': len(all_chunks),
+            'total_chunks': len(chunk_keys),
             'embedding_dimension': dimension,
-            'model': 'text-embedding-3-small',
+            'model': EMBEDDING_MODEL,
             'chunk_size': self.chunk_size,
             'chunk_overlap': self.chunk_overlap,
+            **index_params,
             'embeddings_path': str(index_path),
             'metadata_path': str(metadata_path),
+            'chunks_path': str(chunks_path),
             'stats_path': str(stats_path)
         }
         
         info_path = self.embeddings_folder / "vectorization_info.json"
-        with open(info_path, 'w') as f:
-            json.dump(vectorization_info, f, indent=2)
+        _write_json(vectorization_info, info_path)
         
         logger.info(f"Vectorization completed successfully!")
-        logger.info(f"Processed {len(file_stats)} files into {len(all_chunks)} chunks")
+        logger.info(f"Processed {len(file_stats)} files into {len(chunk_keys)} chunks")
         logger.info(f"Embeddings saved to: {index_path}")
         
         return vectorization_info
@@ -272,6 +789,7 @@ def main():
     parser.add_argument("project_path", help="Path to the project directory")
     parser.add_argument("content_folder", help="Path to the content folder")
     parser.add_argument("openai_api_key", help="OpenAI API key")
+    parser.add_argument("--use-gpu", action="store_true", help="Build large (IVF) indexes on GPU when faiss-gpu is installed")
     
     args = parser.parse_args()
     
@@ -279,7 +797,8 @@ def main():
         vectorizer = ProjectVectorizer(
             project_path=args.project_path,
             content_folder=args.content_folder,
-            openai_api_key=args.openai_api_key
+            openai_api_key=args.openai_api_key,
+            use_gpu=args.use_gpu
         )
         
         result = vectorizer.vectorize_project()